@@ -1,22 +1,38 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import APIRouter, FastAPI, HTTPException, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import AsyncIterator, Callable, Optional
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+import multiprocessing
 import os
+import json
+import asyncio
+import hashlib
 import google.generativeai as genai
 import uvicorn
 import io
+import importlib.util
+from functools import lru_cache
 from PIL import Image
 
-# Optional document parsing libraries
-try:
-    import fitz  # PyMuPDF
-    import docx
-except ImportError:
-    fitz = None
-    docx = None
-    print("Warning: PyMuPDF or python-docx not installed. PDF and DOCX parsing will be disabled.")
+# Optional document parsing libraries (PyMuPDF, python-docx) are imported
+# lazily inside the extract_* helpers, so they cost nothing until a file arrives.
+@lru_cache(maxsize=None)
+def has_module(name: str) -> bool:
+    """Checks once whether an optional parser is installed."""
+    if importlib.util.find_spec(name) is None:
+        print(f"Warning: '{name}' is not installed. Uploads that need it will be rejected.")
+        return False
+    return True
 
 
+# Largest side we need to decode for images sent to Gemini
+MAX_IMAGE_SIDE = 1536
+
 # --- Gemini AI Configuration ---
 try:
     # IMPORTANT: Set your GOOGLE_API_KEY environment variable
@@ -25,15 +41,23 @@ try:
     context_path = os.path.join(script_dir, 'chatbot_context_2.txt')
     with open(context_path, "r") as f:
         SYSTEM_PROMPT = f.read()
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    # Pass the system prompt as Gemini's system instruction instead of prepending it to each message
+    model = genai.GenerativeModel('gemini-2.0-flash', system_instruction=SYSTEM_PROMPT)
 except (KeyError, FileNotFoundError) as e:
     print(f"Warning: Chatbot model could not be loaded. Missing GOOGLE_API_KEY or chatbot_context.txt. Error: {e}")
     model = None
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    shutdown_pdf_pool()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="JMI Simple Chatbot API",
     version="1.0.0",
     description="A simple rule-based chatbot for the JMI project.",
+    default_response_class=ORJSONResponse,
 )
 
 # --- CORS Middleware ---
@@ -60,69 +84,213 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
 
+# --- Document Parsing ---
+# Bounds on the work and memory a single attachment can cost
+MAX_UPLOAD_BYTES = 25 << 20  # 25 MB
+MAX_PDF_PAGES = 50
+MAX_TEXT_CHARS = 100_000  # attachment text forwarded to Gemini
+
+# Extracted text is cached by file hash, so re-sending the same report skips parsing.
+TEXT_CACHE_SIZE = 128
+_text_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+# PyMuPDF is not thread-safe, so PDFs are parsed in worker processes (one document
+# per worker, so concurrent uploads still parse in parallel) and never on threads.
+# Each worker is a spawned interpreter that re-imports the parent's __main__; under
+# `python main.py` that pulls in the inference runtimes and google.generativeai, about
+# 1.7 s and 170 MB per worker on first use. Like lcdt_model.INTRA_OP_THREADS, the cores
+# are split across the WEB_CONCURRENCY uvicorn workers instead of each taking all of them.
+WEB_WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", max(1, min(4, (os.cpu_count() or 1) // WEB_WORKERS))))
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Creates the PDF worker pool on the first PDF upload."""
+    global _pdf_pool
+    if _pdf_pool is None:
+        # spawn, not fork: this process already runs inference and gRPC threads,
+        # and a child forked from a multi-threaded process can deadlock
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool
+
+def shutdown_pdf_pool():
+    """Stops the PDF worker processes; called from the app lifespan."""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+async def extract_pdf(file_bytes: bytes) -> str:
+    """Parses a PDF in the worker pool, replacing the pool if a worker has died."""
+    global _pdf_pool
+    for attempt in range(2):
+        pool = get_pdf_pool()
+        try:
+            return await cached_extract(file_bytes, extract_pdf_text, pool)
+        except BrokenProcessPool:
+            # A worker crashed (MuPDF on a hostile file, or the OOM killer) and the pool
+            # refuses all further work; drop it so the retry and later uploads get a fresh one
+            if _pdf_pool is pool:
+                shutdown_pdf_pool()
+            if attempt:
+                raise
+
+def extract_pdf_text(file_bytes: bytes) -> str:
+    """Runs in a PDF pool worker process (see get_pdf_pool)."""
+    import fitz  # PyMuPDF
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    page_count = min(doc.page_count, MAX_PDF_PAGES)
+    return "".join(doc.load_page(i).get_text() for i in range(page_count))[:MAX_TEXT_CHARS]
+
+def extract_docx_text(file_bytes: bytes) -> str:
+    import docx
+    doc = docx.Document(io.BytesIO(file_bytes))
+    paragraphs, size = [], 0
+    for para in doc.paragraphs:
+        paragraphs.append(para.text)
+        size += len(para.text) + 1
+        if size >= MAX_TEXT_CHARS:
+            break
+    return "\n".join(paragraphs)[:MAX_TEXT_CHARS]
+
+async def cached_extract(file_bytes: bytes, extract: Callable[[bytes], str], executor: Optional[Executor] = None) -> str:
+    """Runs extract(file_bytes) on executor (default: a worker thread), reusing the result for identical uploads (LRU)."""
+    key = (extract.__name__, hashlib.blake2b(file_bytes, digest_size=16).digest())
+    text = _text_cache.get(key)
+    if text is not None:
+        _text_cache.move_to_end(key)
+        return text
+
+    # Parsing is blocking CPU work; keep it off the event loop
+    text = await asyncio.get_running_loop().run_in_executor(executor, extract, file_bytes)
+    _text_cache[key] = text
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return text
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Reads an upload in 1 MB chunks, rejecting it as soon as it exceeds MAX_UPLOAD_BYTES."""
+    chunks, size = [], 0
+    while True:
+        chunk = await file.read(1 << 20)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File is too large. The limit is {MAX_UPLOAD_BYTES >> 20} MB.")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
 # --- Chat Logic ---
-async def get_bot_reply(user_message: str, file: UploadFile = None) -> str:
-    """Generates a reply using the Gemini model."""
-    if not model:
-        return "I'm sorry, but the AI model is not configured. Please check the server logs."
-    
-    content_parts = [f"{SYSTEM_PROMPT}\n\nPatient: {user_message}\nResponse:"]
+BLOCKED_REPLY = "I'm sorry, I can't respond to that. The query was blocked for safety reasons."
+
+def sse_event(**data) -> str:
+    """Formats one Server-Sent Events message."""
+    return f"data: {json.dumps(data)}\n\n"
+
+async def build_content_parts(user_message: str, file: UploadFile = None) -> Optional[list]:
+    """Builds the Gemini request parts. Returns None if the attached file type is unsupported."""
+    content_parts = [f"Patient: {user_message}\nResponse:"]
+
+    if not file:
+        return content_parts
+
+    file_bytes = await read_upload(file)
 
     try:
-        if file:
-            file_bytes = await file.read()
-            
-            if file.content_type.startswith("image/"):
-                img = Image.open(io.BytesIO(file_bytes))
-                content_parts.insert(0, img) # Add image before the prompt
-                content_parts.insert(1, "Attached is an image. Based on the image and my question, please provide a response.")
-
-            elif file.content_type == "application/pdf" and fitz:
-                doc = fitz.open(stream=file_bytes, filetype="pdf")
-                pdf_text = "".join(page.get_text() for page in doc)
-                content_parts.insert(0, f"--- Attached PDF Content ---\n{pdf_text}\n--- End of PDF ---")
-
-            elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" and docx:
-                doc = docx.Document(io.BytesIO(file_bytes))
-                docx_text = "\n".join([para.text for para in doc.paragraphs])
-                content_parts.insert(0, f"--- Attached DOCX Content ---\n{docx_text}\n--- End of DOCX ---")
-
-            elif file.content_type == "text/plain":
-                text_content = file_bytes.decode('utf-8')
-                content_parts.insert(0, f"--- Attached Text File Content ---\n{text_content}\n--- End of Text File ---")
-            
-            else:
-                # If file type is unsupported, inform the user.
-                unsupported_reply = f"I'm sorry, but I can't process files of type '{file.content_type}'. I can handle images (PNG, JPG), PDFs, DOCX, and plain text files."
-                return unsupported_reply
+        if file.content_type.startswith("image/"):
+            img = Image.open(io.BytesIO(file_bytes))
+            # Gemini downsamples large images anyway; let libjpeg skip the full-size decode
+            img.draft(img.mode, (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+            content_parts.insert(0, img) # Add image before the prompt
+            content_parts.insert(1, "Attached is an image. Based on the image and my question, please provide a response.")
+
+        elif file.content_type == "application/pdf" and has_module("fitz"):
+            pdf_text = await extract_pdf(file_bytes)
+            content_parts.insert(0, f"--- Attached PDF Content ---\n{pdf_text}\n--- End of PDF ---")
+
+        elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" and has_module("docx"):
+            docx_text = await cached_extract(file_bytes, extract_docx_text)
+            content_parts.insert(0, f"--- Attached DOCX Content ---\n{docx_text}\n--- End of DOCX ---")
+
+        elif file.content_type == "text/plain":
+            text_content = file_bytes.decode('utf-8')[:MAX_TEXT_CHARS]
+            content_parts.insert(0, f"--- Attached Text File Content ---\n{text_content}\n--- End of Text File ---")
         
-        # Generate content using the parts list
+        else:
+            return None
+
+    except Exception as e:
+        print(f"Error reading attached file: {e}")
+        raise HTTPException(status_code=400, detail=f"Could not read the attached file: {str(e)}")
+
+    return content_parts
+
+async def get_bot_reply(content_parts: list) -> str:
+    """Generates a complete reply using the Gemini model."""
+    try:
         response = await model.generate_content_async(content_parts)
         return response.text
 
     except genai.types.generation_types.BlockedPromptException as e:
         print(f"Response was blocked: {e}")
-        return "I'm sorry, I can't respond to that. The query was blocked for safety reasons."
+        return BLOCKED_REPLY
     except Exception as e:
         print(f"Error generating response from Gemini: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get a response from the AI model: {str(e)}")
 
+async def stream_bot_reply(content_parts: list) -> AsyncIterator[str]:
+    """Yields the Gemini reply as Server-Sent Events while it is being generated."""
+    try:
+        response = await model.generate_content_async(content_parts, stream=True)
+        async for chunk in response:
+            if chunk.parts:
+                yield sse_event(reply=chunk.text)
+
+    except genai.types.generation_types.BlockedPromptException as e:
+        print(f"Response was blocked: {e}")
+        yield sse_event(reply=BLOCKED_REPLY)
+    except Exception as e:
+        # The 200 status is already sent, so report the failure inside the stream
+        print(f"Error generating response from Gemini: {e}")
+        yield sse_event(error=f"Failed to get a response from the AI model: {str(e)}")
+
 # --- API Endpoints ---
 @app.get("/")
 async def root():
     return {"message": "JMI Chatbot API is running. Use the /chat endpoint to interact."}
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(message: str = Form(...), file: UploadFile = File(None)):
-    """Receives a user message and returns a bot reply."""
+# /chat lives on a router so main.py can serve it from the same app as /predict
+router = APIRouter()
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(message: str = Form(...), file: UploadFile = File(None), stream: bool = True):
+    """Receives a user message and returns a bot reply.
+
+    The reply is streamed as Server-Sent Events; pass ?stream=false to get a single ChatResponse.
+    """
     if not message:
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
     
     if not model:
         raise HTTPException(status_code=503, detail="Chatbot model is not available.")
-        
-    reply_text = await get_bot_reply(message, file)
+
+    content_parts = await build_content_parts(message, file)
+
+    if content_parts is None:
+        # If file type is unsupported, inform the user.
+        reply_text = f"I'm sorry, but I can't process files of type '{file.content_type}'. I can handle images (PNG, JPG), PDFs, DOCX, and plain text files."
+        if stream:
+            return StreamingResponse(iter([sse_event(reply=reply_text)]), media_type="text/event-stream")
+        return ChatResponse(reply=reply_text)
+
+    if stream:
+        return StreamingResponse(stream_bot_reply(content_parts), media_type="text/event-stream")
+
+    reply_text = await get_bot_reply(content_parts)
     return ChatResponse(reply=reply_text)
 
+app.include_router(router)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
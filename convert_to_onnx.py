@@ -0,0 +1,45 @@
+# convert_to_onnx.py
+"""
+One-shot converter: LCDT SavedModel -> ONNX model for ONNX Runtime.
+
+Usage:
+    python convert_to_onnx.py
+
+The output is written to LCDT_converted.onnx, which lcdt_model.py serves
+automatically at startup (ahead of the TFLite and Keras models) when
+onnxruntime is installed.
+
+Needs tf2onnx and tf_keras (pip install tf2onnx tf_keras==2.16.0).
+"""
+import argparse
+
+import tensorflow as tf
+import tf2onnx
+
+# Same float32 rebuild as the TFLite converter: the mixed_float16 graph
+# would otherwise be exported with float16 convolutions
+from convert_to_tflite import BASE_DIR, IMG_SIZE, load_float32_model
+
+OUTPUT_PATH = BASE_DIR / "LCDT_converted.onnx"
+OPSET = 17
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--opset", type=int, default=OPSET)
+    args = parser.parse_args()
+
+    # Dynamic batch dimension so the micro-batcher can send several images per run
+    input_signature = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 1), tf.float32, name="input"),)
+    model_proto, _ = tf2onnx.convert.from_keras(
+        load_float32_model(),
+        input_signature=input_signature,
+        opset=args.opset,
+        output_path=str(args.output),
+    )
+    print(f"✅ Wrote {args.output} ({model_proto.ByteSize() / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
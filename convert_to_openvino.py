@@ -0,0 +1,46 @@
+# convert_to_openvino.py
+"""
+One-shot converter: LCDT SavedModel -> OpenVINO IR for Intel CPUs.
+
+Usage:
+    python convert_to_openvino.py
+
+The output is written to LCDT_converted.xml/.bin (FP16-compressed weights),
+which lcdt_model.py serves automatically at startup, ahead of the ONNX,
+TFLite and Keras models, when openvino is installed.
+
+Needs openvino and tf_keras (pip install openvino tf_keras==2.16.0).
+"""
+import argparse
+
+import openvino as ov
+import tensorflow as tf
+
+# Same float32 rebuild as the TFLite converter: the mixed_float16 graph
+# would otherwise be exported with float16 convolutions
+from convert_to_tflite import BASE_DIR, IMG_SIZE, load_float32_model
+
+OUTPUT_PATH = BASE_DIR / "LCDT_converted.xml"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    model = load_float32_model()
+
+    # Trace the inference graph only: the saved training graph includes the
+    # augmentation layers' random ops, which OpenVINO cannot convert.
+    # Dynamic batch dimension so the micro-batcher can send several images per run
+    @tf.function(input_signature=[tf.TensorSpec([None, IMG_SIZE, IMG_SIZE, 1], tf.float32)])
+    def infer(x):
+        return model(x, training=False)
+
+    ov_model = ov.convert_model(infer.get_concrete_function())
+    ov.save_model(ov_model, str(args.output), compress_to_fp16=True)
+    print(f"✅ Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
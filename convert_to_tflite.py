@@ -0,0 +1,100 @@
+# convert_to_tflite.py
+"""
+One-shot converter: LCDT SavedModel -> TFLite flatbuffer.
+
+Usage:
+    python convert_to_tflite.py                                              # FP16 weights
+    python convert_to_tflite.py --quantize int8 path/to/calibration_xrays/   # INT8
+    python convert_to_tflite.py --quantize none                              # FP32
+
+FP16 is the default: half-size weights with float accuracy, and none of the
+int8 kernel regressions seen on some x86 servers. INT8 needs a calibration
+folder with ~100 representative chest X-rays (PNG/JPG). The output is written
+to LCDT_converted.tflite, which lcdt_model.py picks up automatically at startup.
+
+Needs tf_keras (pip install tf_keras==2.16.0) to read the TF 2.9 Keras SavedModel.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+# Paths are relative to this file, so the converters can be run from anywhere
+BASE_DIR = Path(__file__).resolve().parent
+# LCDT_converted.keras is only a TFSMLayer wrapper around this SavedModel,
+# so we convert the SavedModel directly.
+SAVED_MODEL_DIR = BASE_DIR / "export_tf29"
+OUTPUT_PATH = BASE_DIR / "LCDT_converted.tflite"
+IMG_SIZE = 128
+NUM_CALIBRATION_IMAGES = 100
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def load_float32_model():
+    """Loads the SavedModel and rebuilds it with a float32 dtype policy.
+
+    The model was trained with mixed_float16; its float16 Conv2D/BatchNorm
+    ops have no TFLite builtin kernels, so conversion fails as-is.
+    """
+    import tf_keras  # Keras 2, which understands the SavedModel's keras_metadata
+
+    mixed = tf_keras.models.load_model(str(SAVED_MODEL_DIR), compile=False)
+    config = json.loads(json.dumps(mixed.get_config()).replace('"mixed_float16"', '"float32"'))
+    model = tf_keras.Model.from_config(config)
+    model.set_weights(mixed.get_weights())
+    return model
+
+
+def representative_dataset(image_dir: str):
+    files = sorted(
+        name for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:NUM_CALIBRATION_IMAGES]
+    if not files:
+        raise SystemExit(f"No calibration images found in {image_dir}")
+
+    def gen():
+        for name in files:
+            # Must match lcdt_model.preprocess_image
+            image = Image.open(os.path.join(image_dir, name))
+            image.draft("L", (IMG_SIZE, IMG_SIZE))
+            image = image.convert("L").resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR)
+            img_array = np.asarray(image, dtype=np.float32)
+            img_array *= np.float32(1.0 / 255.0)
+            yield [img_array[None, ..., None]]
+
+    return gen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("calibration_dir", nargs="?", help="Folder of chest X-rays used for INT8 calibration")
+    parser.add_argument("--quantize", choices=["float16", "int8", "none"], default="float16")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(load_float32_model())
+    if args.quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif args.quantize == "int8":
+        if not args.calibration_dir:
+            parser.error("INT8 quantization needs a calibration_dir")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(args.calibration_dir)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    tflite_model = converter.convert()
+    with open(args.output, "wb") as f:
+        f.write(tflite_model)
+    print(f"✅ Wrote {args.output} ({len(tflite_model) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
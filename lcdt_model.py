@@ -0,0 +1,265 @@
+# lcdt_model.py
+# Loads the LCDT chest X-ray model once per process (see load) and serves batched predictions.
+from PIL import Image
+import asyncio
+import numpy as np
+import os
+from pathlib import Path
+
+# Prefer the slim tflite-runtime wheel (XNNPACK kernels built in); TensorFlow
+# itself is only imported when that wheel is missing or for the Keras fallback
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    Interpreter = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    import openvino as ov
+except ImportError:
+    ov = None
+
+# -----------------------------
+# Model Loading
+# -----------------------------
+# Resolved once at import, relative to this file rather than the working directory
+BASE_DIR = Path(__file__).resolve().parent
+# LCDT_converted.keras only wraps this SavedModel in a TFSMLayer that stores a
+# working-directory-relative path, so the SavedModel is loaded directly
+MODEL_PATH = BASE_DIR / "export_tf29"
+IMG_SIZE = 128
+TFLITE_MODEL_PATH = BASE_DIR / "LCDT_converted.tflite"  # produced by convert_to_tflite.py
+ONNX_MODEL_PATH = BASE_DIR / "LCDT_converted.onnx"  # produced by convert_to_onnx.py
+OPENVINO_MODEL_PATH = BASE_DIR / "LCDT_converted.xml"  # produced by convert_to_openvino.py
+model = None
+interpreter = None
+session = None
+compiled_model = None
+tf = None
+
+# Uvicorn worker processes (see main.py); each one loads its own model copy
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Split the cores between workers so they don't oversubscribe each other; a
+# 128x128 CNN gains nothing past a few threads anyway
+INTRA_OP_THREADS = int(os.environ.get("INTRA_OP_THREADS", max(1, min(4, (os.cpu_count() or 1) // WORKERS))))
+
+def import_tensorflow():
+    """Imports and configures TensorFlow on first use."""
+    global tf
+    if tf is None:
+        # TensorFlow reads these at import time
+        os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1")  # oneDNN AVX2/AVX-512 conv kernels
+        os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+        os.environ.setdefault("OMP_NUM_THREADS", str(INTRA_OP_THREADS))
+        import tensorflow
+        tensorflow.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+        tensorflow.config.threading.set_inter_op_parallelism_threads(1)
+        # CPU serving: keep TF from initializing CUDA and reserving GPU memory
+        tensorflow.config.set_visible_devices([], "GPU")
+        tf = tensorflow
+    return tf
+
+# OpenVINO would default to bf16 on AMX/AVX-512 BF16 CPUs, which is several
+# times faster but rounds raw_value to ~3 significant digits; opt in with "bf16"
+OPENVINO_PRECISION = os.environ.get("OPENVINO_PRECISION", "f32")
+
+def load():
+    """Loads the first available model format: OpenVINO IR, ONNX, TFLite, then Keras.
+
+    Called from the app lifespan, so merely importing this module (the uvicorn
+    supervisor, spawned helper processes) never loads a model.
+    """
+    global model, interpreter, session, compiled_model, _infer
+    global infer_request, onnx_input_name, input_details, output_details
+    if is_loaded():
+        return
+
+    # Prefer the OpenVINO IR when it has been generated: on Intel CPUs it compiles
+    # to oneDNN kernels with aggressive graph folding
+    if ov is not None and os.path.exists(OPENVINO_MODEL_PATH):
+        try:
+            compiled_model = ov.Core().compile_model(OPENVINO_MODEL_PATH, "CPU", {
+                "PERFORMANCE_HINT": "LATENCY",
+                "INFERENCE_NUM_THREADS": INTRA_OP_THREADS,
+                "INFERENCE_PRECISION_HINT": OPENVINO_PRECISION,
+            })
+            infer_request = compiled_model.create_infer_request()
+            # Warm-up pass so the first request doesn't pay kernel setup
+            infer_request.infer({0: np.zeros((1, IMG_SIZE, IMG_SIZE, 1), dtype=np.float32)})
+            print("🔥 OpenVINO model loaded successfully:", OPENVINO_MODEL_PATH)
+        except Exception as e:
+            print("❌ Failed to load OpenVINO model:", e)
+            compiled_model = None
+
+    # Then the ONNX model: ONNX Runtime's C++ session has far less per-call
+    # overhead than TensorFlow for a small CNN
+    if compiled_model is None and ort is not None and os.path.exists(ONNX_MODEL_PATH):
+        try:
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = INTRA_OP_THREADS
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(ONNX_MODEL_PATH, options, providers=["CPUExecutionProvider"])
+            onnx_input_name = session.get_inputs()[0].name
+            # Warm-up pass so the first request doesn't pay kernel setup
+            session.run(None, {onnx_input_name: np.zeros((1, IMG_SIZE, IMG_SIZE, 1), dtype=np.float32)})
+            print("🔥 ONNX model loaded successfully:", ONNX_MODEL_PATH)
+        except Exception as e:
+            print("❌ Failed to load ONNX model:", e)
+            session = None
+
+    # Then the TFLite model
+    if compiled_model is None and session is None and os.path.exists(TFLITE_MODEL_PATH):
+        try:
+            interpreter_class = Interpreter or import_tensorflow().lite.Interpreter
+            interpreter = interpreter_class(model_path=str(TFLITE_MODEL_PATH), num_threads=INTRA_OP_THREADS)
+            interpreter.allocate_tensors()
+            input_details = interpreter.get_input_details()[0]
+            output_details = interpreter.get_output_details()[0]
+            # Warm-up pass: XNNPACK packs its weights on the first invoke
+            interpreter.set_tensor(input_details["index"], np.zeros(input_details["shape"], dtype=input_details["dtype"]))
+            interpreter.invoke()
+            print("🔥 TFLite model loaded successfully:", TFLITE_MODEL_PATH)
+        except Exception as e:
+            print("❌ Failed to load TFLite model:", e)
+            interpreter = None
+
+    # Otherwise fall back to the full Keras model
+    if compiled_model is None and session is None and interpreter is None:
+        if os.path.exists(MODEL_PATH):
+            try:
+                import_tensorflow()
+                model = tf.keras.layers.TFSMLayer(str(MODEL_PATH), call_endpoint="serving_default")
+
+                # Fixed input signature (any batch size): traced once here, never retraced per request
+                @tf.function(input_signature=[tf.TensorSpec([None, IMG_SIZE, IMG_SIZE, 1], tf.float32)])
+                def infer(x):
+                    outputs = model(x, training=False)
+                    # TFSMLayer returns the serving signature's {name: tensor} dict
+                    if isinstance(outputs, dict):
+                        outputs = next(iter(outputs.values()))
+                    return outputs
+
+                # Force the trace now and keep the concrete function, which also skips
+                # tf.function's per-call argument matching
+                _infer = infer.get_concrete_function()
+
+                # Warm-up pass so the first request doesn't pay kernel setup
+                _infer(tf.zeros((1, IMG_SIZE, IMG_SIZE, 1), dtype=tf.float32))
+                print("🔥 Model loaded successfully:", MODEL_PATH)
+            except Exception as e:
+                print("❌ Failed to load model:", e)
+                model = None
+        else:
+            print("❌ Model not found at:", MODEL_PATH)
+
+def is_loaded() -> bool:
+    return any(backend is not None for backend in (model, interpreter, session, compiled_model))
+
+# -----------------------------
+# Utility: Image Preprocessing
+# -----------------------------
+def preprocess_image(image: Image.Image) -> np.ndarray:
+    # Resize to your model input size. Bilinear is pinned because the default
+    # filter differs across Pillow versions
+    image = image.resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR)
+    if image.mode != "L":
+        image = image.convert("L")  # one byte per pixel, so the raw buffer is the image
+    # Read the raw bytes directly rather than through __array_interface__
+    pixels = np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(1, IMG_SIZE, IMG_SIZE, 1)
+    # Fused uint8 -> float32 normalize into the final (1, H, W, 1) array; the
+    # float32 scalar keeps NumPy from upcasting to float64
+    img_array = np.empty((1, IMG_SIZE, IMG_SIZE, 1), dtype=np.float32)
+    np.multiply(pixels, np.float32(1.0 / 255.0), out=img_array)
+    return img_array
+
+# -----------------------------
+# Utility: TFLite Inference
+# -----------------------------
+def run_tflite(img_array: np.ndarray) -> float:
+    # Quantize the input if the model was converted with int8 I/O
+    if input_details["dtype"] != np.float32:
+        scale, zero_point = input_details["quantization"]
+        # Saturate pixels outside the calibrated range instead of letting astype wrap them
+        limits = np.iinfo(input_details["dtype"])
+        img_array = np.clip(np.round(img_array / scale + zero_point), limits.min, limits.max)
+        img_array = img_array.astype(input_details["dtype"])
+
+    interpreter.set_tensor(input_details["index"], img_array)
+    interpreter.invoke()
+    # Read the single score straight from the interpreter's output buffer;
+    # get_tensor would copy it into a new array first
+    value = float(interpreter.tensor(output_details["index"])().flat[0])
+
+    if output_details["dtype"] != np.float32:
+        scale, zero_point = output_details["quantization"]
+        value = (value - zero_point) * scale
+    return value
+
+# -----------------------------
+# Micro-batching
+# -----------------------------
+# Concurrent predictions are collected for up to BATCH_WINDOW seconds and
+# run through the model together, amortizing the per-call launch overhead.
+# Tunable per deployment: wider windows batch more under load at the cost of latency
+BATCH_WINDOW = float(os.environ.get("BATCH_WINDOW_MS", 5)) / 1000
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 16))
+batch_queue = None  # asyncio.Queue of (img_array, future), created by start_batch_runner
+# Reused for every batch: the runner waits for predict_batch to return before
+# it assembles the next batch, so only one batch ever reads from it
+batch_buffer = np.empty((MAX_BATCH_SIZE, IMG_SIZE, IMG_SIZE, 1), dtype=np.float32)
+
+def predict_batch(batch: np.ndarray) -> np.ndarray:
+    """Runs a (N, IMG_SIZE, IMG_SIZE, 1) batch through the model and returns N scores."""
+    if compiled_model is not None:
+        # Like the ONNX model, the IR keeps a dynamic batch dimension
+        return infer_request.infer({0: batch})[compiled_model.output(0)].reshape(-1)
+    if session is not None:
+        # The ONNX model keeps a dynamic batch dimension
+        return session.run(None, {onnx_input_name: batch})[0].reshape(-1)
+    if interpreter is not None:
+        # The TFLite model is converted with a fixed batch size of 1
+        return np.array([run_tflite(img_array[None]) for img_array in batch], dtype=np.float32)
+    # Keras 3 / TFSMLayer safe inference
+    return _infer(tf.constant(batch)).numpy().reshape(-1)
+
+async def batch_runner():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await batch_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < MAX_BATCH_SIZE and loop.time() < deadline:
+            try:
+                batch.append(batch_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                await asyncio.sleep(0.001)
+
+        images = np.concatenate([img_array for img_array, _ in batch], out=batch_buffer[:len(batch)])
+        try:
+            # Run inference off the event loop so uploads keep being accepted
+            scores = await asyncio.to_thread(predict_batch, images)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        for (_, future), score in zip(batch, scores):
+            if not future.done():
+                future.set_result(float(score))
+
+def start_batch_runner() -> asyncio.Task:
+    """Creates the queue on the running event loop and starts the batch runner."""
+    global batch_queue
+    batch_queue = asyncio.Queue()
+    return asyncio.create_task(batch_runner())
+
+async def predict(img_array: np.ndarray) -> float:
+    """Queues one preprocessed image for the batch runner and waits for its score."""
+    future = asyncio.get_running_loop().create_future()
+    batch_queue.put_nowait((img_array, future))
+    return await future
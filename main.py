@@ -1,16 +1,37 @@
 # main.py
 from fastapi import FastAPI, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
-import io
-import tensorflow as tf
+from PIL import Image, UnidentifiedImageError
+from contextlib import asynccontextmanager
 import os
-from fastapi.responses import FileResponse
+from pathlib import Path
+from fastapi.responses import FileResponse, ORJSONResponse
+
+import lcdt_model
+from lcdt_model import IMG_SIZE, preprocess_image
+
+# The chatbot is served by this same app when its dependencies are installed
+try:
+    from back_end_chatbot import router as chat_router, shutdown_pdf_pool
+except ImportError as e:
+    chat_router = None
+    print("❌ Chatbot routes disabled:", e)
 
 # -----------------------------
 # App Initialization
 # -----------------------------
-app = FastAPI(title="AI DR Assistant API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loaded here rather than at import, so only processes that serve requests hold a model
+    lcdt_model.load()
+    runner = lcdt_model.start_batch_runner()
+    yield
+    runner.cancel()
+    if chat_router is not None:
+        shutdown_pdf_pool()
+
+# orjson serializes responses in C instead of json.dumps
+app = FastAPI(title="AI DR Assistant API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Enable CORS (if frontend calls from another domain)
 app.add_middleware(
@@ -20,36 +41,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# /chat, served from the same process
+if chat_router is not None:
+    app.include_router(chat_router)
+
 # Serve index.html at the root
+INDEX_PATH = Path(__file__).resolve().parent / "index.html"
+
 @app.get("/")
 async def read_root():
-    return FileResponse("index.html")
-
-# -----------------------------
-# Model Loading
-# -----------------------------
-MODEL_PATH = "LCDT_converted.keras"
-model = None
-
-if os.path.exists(MODEL_PATH):
-    try:
-        model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-        print("🔥 Model loaded successfully:", MODEL_PATH)
-    except Exception as e:
-        print("❌ Failed to load model:", e)
-else:
-    print("❌ Model not found at:", MODEL_PATH)
-
-# -----------------------------
-# Utility: Image Preprocessing
-# -----------------------------
-def preprocess_image(image: Image.Image):
-    # Resize to your model input size
-    image = image.resize((128, 128))
-    img_array = tf.keras.utils.img_to_array(image)
-    img_array = tf.expand_dims(img_array, 0)  # Add batch dimension
-    img_array = img_array / 255.0  # Normalize if needed
-    return img_array
+    return FileResponse(INDEX_PATH)
 
 # -----------------------------
 # Health Check
@@ -64,19 +65,24 @@ async def health():
 # -----------------------------
 @app.post("/predict")
 async def predict(file: UploadFile = File(...)):
-    global model
-    if model is None:
+    if not lcdt_model.is_loaded():
         return {"error": "Model not loaded"}
 
     try:
-        # Read and preprocess image
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        img_array = preprocess_image(image)
+        # Decode straight from the spooled upload file instead of copying it into bytes;
+        # the with block releases PIL's decoder state as soon as the pixels are read
+        with Image.open(file.file) as image:
+            # Let libjpeg decode at a reduced DCT scale (no-op for non-JPEGs)
+            image.draft("L", (IMG_SIZE, IMG_SIZE))
+            # The model expects a single grayscale channel: (1, 128, 128, 1)
+            img_array = preprocess_image(image.convert("L"))
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError, SyntaxError) as e:
+        # Unreadable, truncated, corrupt or oversized uploads (PIL raises SyntaxError for broken PNG chunks)
+        return {"error": f"Invalid image: {e}"}
 
-        # Keras 3 / TFSMLayer safe inference
-        pred = model(img_array, training=False).numpy()
-        prediction = float(pred.squeeze())
+    try:
+        # Batched with any concurrent requests
+        prediction = await lcdt_model.predict(img_array)
 
         # Interpret result
         result = "Positive" if prediction > 0.5 else "Negative"
@@ -94,4 +100,5 @@ async def predict(file: UploadFile = File(...)):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Multiple workers need the import string; set WEB_CONCURRENCY to the core count
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=lcdt_model.WORKERS)